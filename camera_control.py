@@ -1,20 +1,29 @@
 """
 camera_control.py  - 20250412 CJH
 
-Provides utility functions for controlling camera hardware using v4l2-ctl
+Provides utility functions for controlling camera hardware through V4L2
 and for automatically tuning exposure based on image saturation levels.
 
 Functions:
 - set_camera_param(device, param, value):
-    Sends a v4l2-ctl command to set a camera control parameter.
-
-- auto_exposure_tune(cam_device, cam_queue, target_pct=1.5, exposure_list=None):
-    Iteratively selects the lowest exposure from the list that keeps saturation
-    below the given target percentage, using frames from the provided queue.
-
-    The queue should provide dicts with a 'mask' array indicating saturated pixels.
-    In a dual-queue architecture, this should be the *view queue* (not the data queue),
-    to avoid interfering with downstream processing.
+    Sets a camera control parameter (named as in v4l2-ctl, e.g. exposure_time_absolute)
+    with a VIDIOC_S_CTRL ioctl on a cached device handle, falling back to the
+    v4l2-ctl command if the ioctl path is unavailable.
+
+- auto_exposure_tune(cam_device, view_slot, target_pct=1.5, exposure_list=None,
+                     settle_s=0.05, frame_period_s=1/30):
+    Selects the highest exposure from the list that keeps saturation below the
+    given target percentage, using frames from the provided view slot. Saturation only
+    grows with exposure, so the list is binary searched (O(log N) camera settings).
+    After each setting it waits settle_s for drivers that apply controls late, then
+    only accepts frames timestamped at least one frame period after the change.
+
+    The slot should provide dicts with a 'mask' array indicating saturated pixels.
+    The mask is expected to be a uint8 array as produced by cv2.inRange; a boolean
+    mask is reinterpreted as uint8 so the vectorized pixel count still applies.
+    Pass the pipeline's view slot (shared_state.LatestSlot, e.g. pipeline.view_slot):
+    reading it does not consume frames, so the tune does not starve downstream
+    processing the way taking from a pipeline queue would.
 
     hints on things to do to cam1 / cam2 -
     v4l2-ctl -d /dev/video0 --list-ctrls
@@ -41,23 +50,103 @@ Functions:
 
 
 import subprocess
-import numpy as np
 import time
+import numpy as np
 import queue
+import cv2
+import os
+import re
+import fcntl
+import struct
+
+
+# --- V4L2 ioctl definitions (linux/videodev2.h) ---
+# struct v4l2_queryctrl: id, type, name[32], minimum, maximum, step, default_value, flags, reserved[2]
+_QUERYCTRL_FMT = 'II32siiiiI2I'
+# struct v4l2_control: id, value
+_CONTROL_FMT = 'Ii'
+
+def _iowr(nr, size):
+    return (3 << 30) | (size << 16) | (ord('V') << 8) | nr
+
+VIDIOC_QUERYCTRL = _iowr(36, struct.calcsize(_QUERYCTRL_FMT))
+VIDIOC_S_CTRL = _iowr(28, struct.calcsize(_CONTROL_FMT))
+V4L2_CTRL_FLAG_DISABLED = 0x0001
+V4L2_CTRL_FLAG_NEXT_CTRL = 0x80000000
+V4L2_CTRL_TYPE_CTRL_CLASS = 6
+
+# Open control handles and their name -> control id maps, keyed by device path
+_device_controls = {}
+
+
+def _control_name(raw_name):
+    """Converts a driver control name to the v4l2-ctl form ('Exposure Time, Absolute' -> 'exposure_time_absolute')."""
+    name = raw_name.split(b'\0', 1)[0].decode(errors='replace').lower()
+    return re.sub(r'[^a-z0-9]+', '_', name).strip('_')
+
+
+def _open_controls(device):
+    """Opens the device once and enumerates its controls."""
+    if device in _device_controls:
+        return _device_controls[device]
+
+    fd = os.open(device, os.O_RDWR | os.O_NONBLOCK)
+    controls = {}
+    query_id = V4L2_CTRL_FLAG_NEXT_CTRL
+    while True:
+        buf = bytearray(struct.pack(_QUERYCTRL_FMT, query_id, 0, b'', 0, 0, 0, 0, 0, 0, 0))
+        try:
+            fcntl.ioctl(fd, VIDIOC_QUERYCTRL, buf)
+        except OSError:
+            break  # EINVAL marks the end of the control list
+        ctrl_id, ctrl_type, name, *_, flags, _, _ = struct.unpack(_QUERYCTRL_FMT, buf)
+        if ctrl_type != V4L2_CTRL_TYPE_CTRL_CLASS and not flags & V4L2_CTRL_FLAG_DISABLED:
+            controls[_control_name(name)] = ctrl_id
+        query_id = ctrl_id | V4L2_CTRL_FLAG_NEXT_CTRL
+
+    _device_controls[device] = (fd, controls)
+    return fd, controls
 
 
 def set_camera_param(device, param, value):
+    try:
+        fd, controls = _open_controls(device)
+        fcntl.ioctl(fd, VIDIOC_S_CTRL, struct.pack(_CONTROL_FMT, controls[param], int(value)))
+        print(f"[CameraControl] Set {param} to {value} on {device}")
+        return
+    except (OSError, KeyError) as e:
+        print(f"[CameraControl] ioctl set of {param} on {device} failed ({e!r}); trying v4l2-ctl")
+
     try:
         subprocess.run(
             ["v4l2-ctl", "-d", device, f"--set-ctrl={param}={value}"],
             check=True
         )
         print(f"[CameraControl] Set {param} to {value} on {device}")
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, OSError) as e:
         print(f"[CameraControl] Failed to set {param} on {device}: {e}")
 
 
-def auto_exposure_tune(cam_device, cam_queue, target_pct=1.5, exposure_list=None):
+def _fresh_frame(view_slot, not_before_ns, timeout=1.0):
+    """
+    Waits on a LatestSlot for a frame whose 'timestamp' (time.monotonic_ns) is at least
+    not_before_ns. Older frames (still in the driver's buffers, the reader or the pipeline
+    queues when a setting changed) are skipped. Raises queue.Empty if none arrives within
+    the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    seq = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise queue.Empty
+        seq, frame_data = view_slot.wait_newer(seq, timeout=remaining)
+        if frame_data is not None and frame_data.get('timestamp', 0) >= not_before_ns:
+            return frame_data
+
+
+def auto_exposure_tune(cam_device, view_slot, target_pct=1.5, exposure_list=None,
+                       settle_s=0.05, frame_period_s=1/30):
     exposure_param = 'exposure_time_absolute'  # "exposure_absolute"
     if exposure_list is None:
         # seems on the dual arducam I can use 1 through 100, so about two orders of magnitude of dynamic range
@@ -65,25 +154,39 @@ def auto_exposure_tune(cam_device, cam_queue, target_pct=1.5, exposure_list=None
         exposure_list = [200, 100, 50, 30, 20, 10, 5, 2]  # logitechs
 
     print(f"\n[AutoExposure] Starting sweep on {cam_device}")
+    exposures = sorted(exposure_list)
     best_exposure = None
-    for exposure in exposure_list:
-
+    max_sat_pixels = None
+    low, high = 0, len(exposures) - 1
+    while low <= high:
+        mid = (low + high) // 2
+        exposure = exposures[mid]
+
+        # Frames stamped before the change plus one frame period may have been exposed
+        # with the previous setting
+        t0 = time.monotonic_ns()
         set_camera_param(cam_device, exposure_param, exposure)
-        time.sleep(0.1)  # let setting take effect
+        time.sleep(settle_s)
 
         try:
-            frame_data = cam_queue.get(timeout=1.0)
+            frame_data = _fresh_frame(view_slot, t0 + int(frame_period_s * 1e9))
         except queue.Empty:
             print(f"[AutoExposure] Timeout at exposure {exposure}")
-            continue
+            break
 
-        mask = frame_data['mask']
-        saturation_pct = 100.0 * np.count_nonzero(mask) / mask.size
-        print(f"Exposure {exposure:5d} µs → Saturation: {saturation_pct:.2f}%")
+        mask = frame_data['mask'].view(np.uint8)
+        if max_sat_pixels is None:
+            # The mask size is fixed for the sweep, so compare pixel counts instead of percentages
+            max_sat_pixels = int(target_pct * 0.01 * mask.size)
+        nz = cv2.countNonZero(mask)
+        print(f"Exposure {exposure:5d} µs → Saturation: {100.0 * nz / mask.size:.2f}%")
 
-        if saturation_pct <= target_pct:
+        if nz <= max_sat_pixels:
+            # Acceptable; look for a longer exposure that still is
             best_exposure = exposure
-            break
+            low = mid + 1
+        else:
+            high = mid - 1
 
     if best_exposure:
         print(f"[AutoExposure] Selected exposure: {best_exposure} \n")
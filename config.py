@@ -18,6 +18,14 @@ CAMERAS = [
         # 'source': static_test_grid,  # Use function static_test_grid instead of path string
         'source': "/dev/video0",
         'resolution': resolution,
+        # True requests GREY/Y800 (or YUYV, keeping only the luma plane), with no BGR decode; needs enough USB bandwidth.
+        'grayscale_capture': False,
+        # True uses the Numba mask+outline kernel from kernels.py when numba is installed.
+        'use_numba': False,
+        # CPU cores (e.g. {1}) to pin this camera's threads to on Linux; None lets the OS schedule them.
+        'cpu_affinity': None,
+        # Processed frames queued for fusion; 2 lets fusion double-buffer, and older ones are dropped.
+        'queue_depth': 2,
         # The pipeline is now simpler: just grab and find contours.
         'pipeline': ['process_contours'],
         'overlay_color': (255, 0, 0),
@@ -29,6 +37,10 @@ CAMERAS = [
         # 'source': dynamic_test_image,  # Use function dynamic_test_image instead of path string
         'source': "/dev/video2",
         'resolution': resolution,
+        'grayscale_capture': False,
+        'use_numba': False,
+        'cpu_affinity': None,
+        'queue_depth': 2,
         'pipeline': ['process_contours'],
         'overlay_color': (0, 0, 255),
     },
@@ -43,12 +55,42 @@ FUSION_CONFIG = {
     # CLAHE settings are now part of the fusion process, applied by FinalProcessor.
     'clahe_clip_limit': 4.0,
     'clahe_tile_grid_size': (8, 8),
+    # True runs CLAHE through cv2.cuda when OpenCV is built with CUDA and a device is present.
+    'use_cuda': False,
+    # CPU cores for the FusionWorker and FinalProcessor threads (Linux only); None for no pinning.
+    'cpu_affinity': None,
 }
 
 # Global processing settings
 SATURATION_THRESHOLD = 240
 
+# Recording settings
+RECORDER_CONFIG = {
+    # Clips are piped to an ffmpeg subprocess with this encoder, e.g. 'h264_v4l2m2m' on a Pi or
+    # 'h264_nvenc' on NVIDIA. None (or ffmpeg missing from PATH) falls back to OpenCV's mp4v writer.
+    'ffmpeg_codec': 'libx264',
+    'ffmpeg_codec_args': ['-preset', 'ultrafast', '-b:v', '4M'],
+    # True records 'outlined' clips as MJPEG by muxing the web stream's JPEGs (needs ffmpeg),
+    # so the frames are not encoded a second time. The files are larger than H.264.
+    'mux_stream_jpeg': True,
+}
+
 # Web server settings
 WEB_SERVER_CONFIG = {
     'port': 5000,
+    # 'waitress' serves through waitress when installed, falling back to Flask's development server.
+    'server': 'waitress',
+    # Waitress worker threads for ordinary requests (page, /record, /align, ...).
+    'threads': 8,
+    # Open browser tabs the server supports at once. Each tab holds two threads for as long
+    # as it is open (its /stream view and the recording-status SSE), so the pool gets
+    # 2 * max_viewers threads on top of 'threads'. Streams beyond the limit get a 503.
+    'max_viewers': 8,
+    # JPEG quality for the MJPEG streams; 80 is roughly half the bytes and encode time of OpenCV's default 95.
+    'jpeg_quality': 80,
+    # True lowers a stream's JPEG quality while a viewer's socket writes take longer than
+    # the frame interval and recovers it gradually, down to 'jpeg_quality_min'. While a
+    # muxed recording of the stream runs, it is encoded at 'jpeg_quality' regardless.
+    'adaptive_jpeg_quality': True,
+    'jpeg_quality_min': 50,
 }
@@ -7,8 +7,10 @@ and now includes a pausing mechanism for the stream feeder.
 
 Responsibilities:
 - Defines Flask routes for the web UI (/), streaming, and controls.
+- Pushes recording status to the page as Server-Sent Events.
 - Defines a feeder thread to populate the web view data from the pipelines.
 - Provides controls to pause and resume the feeder for special tasks.
+- Runs the web server (waitress when available, else Flask's development server).
 """
 
 from flask import Flask, Response, render_template, jsonify, request
@@ -17,13 +19,70 @@ import time
 import queue
 import cv2
 import contextlib
+import json
 
+import config
 import shared_state
-from recorder import start_recording, get_status
+from recorder import start_recording, get_status, status_updates
 from utils import estimate_shift
 
+try:
+    from turbojpeg import TurboJPEG, TJSAMP_420
+    _turbojpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    # PyTurboJPEG is optional; without it (or without libturbojpeg) OpenCV encodes.
+    _turbojpeg = None
+
 app = Flask(__name__)
 
+# Baseline (non-progressive) JPEG without Huffman-table optimization keeps encoding cheap.
+_JPEG_PARAMS = [
+    int(cv2.IMWRITE_JPEG_QUALITY), config.WEB_SERVER_CONFIG.get('jpeg_quality', 80),
+    int(cv2.IMWRITE_JPEG_OPTIMIZE), 0,
+    int(cv2.IMWRITE_JPEG_PROGRESSIVE), 0,
+]
+
+
+# Current JPEG quality per stream ID. With 'adaptive_jpeg_quality', viewers whose sends
+# take longer than the frame interval lower it multiplicatively and viewers that keep up
+# raise it by a tenth of a step per frame, between 'jpeg_quality_min' and 'jpeg_quality'.
+_jpeg_quality = {}
+
+
+def _adapt_jpeg_quality(stream_id, send_too_slow):
+    """Updates a stream's JPEG quality from one viewer's last send (AIMD)."""
+    web_config = config.WEB_SERVER_CONFIG
+    q_max = _JPEG_PARAMS[1]
+    quality = _jpeg_quality.get(stream_id, q_max)
+    if send_too_slow:
+        quality = max(web_config.get('jpeg_quality_min', 50), quality * 0.8)
+    elif quality < q_max:
+        quality = min(q_max, quality + 0.1)
+    _jpeg_quality[stream_id] = quality
+
+
+def _encode_jpeg(frame, quality):
+    """
+    Encodes a view frame to JPEG, using libturbojpeg directly when it is available.
+    Returns a bytes-like object (bytes or the encoded numpy buffer), or None on failure.
+    """
+    if _turbojpeg is not None and frame.ndim == 3:
+        return _turbojpeg.encode(frame, quality=quality, jpeg_subsample=TJSAMP_420)
+    params = _JPEG_PARAMS if quality == _JPEG_PARAMS[1] else [_JPEG_PARAMS[0], quality, *_JPEG_PARAMS[2:]]
+    ret, jpeg = cv2.imencode('.jpg', frame, params)
+    return jpeg if ret else None
+
+
+# Fixed pieces of each /stream multipart part; only the length is filled in per frame.
+_PART_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n'
+_PART_TRAILER = b'\r\n'
+
+
+def _multipart_chunk(jpeg):
+    """Wraps an encoded JPEG in its multipart/x-mixed-replace part, copying the payload exactly once."""
+    jpeg = memoryview(jpeg)
+    return b''.join((_PART_HEADER % jpeg.nbytes, jpeg, _PART_TRAILER))
+
 
 # --- Stream Feeder Control ---
 
@@ -49,6 +108,33 @@ def feeder_paused_context():
 
 # --- Generic Stream Feeder ---
 
+def _publish_view(stream_id, data):
+    """Stores a new packet for web display and, if it has viewers, encodes its view frame once for all of them."""
+    slot = shared_state.stream_data.get(stream_id)
+    if slot is None:
+        slot = shared_state.stream_data[stream_id] = shared_state.LatestSlot()
+    else:
+        try:
+            if slot.get() is data:
+                return
+        except queue.Empty:
+            pass
+    slot.put(data)
+
+    if not shared_state.jpeg_consumers[stream_id]:
+        return
+    frame = data.get('outlined')
+    if frame is None:
+        return
+    quality = _JPEG_PARAMS[1]
+    if not shared_state.jpeg_recorders[stream_id]:
+        quality = int(_jpeg_quality.get(stream_id, quality))
+    jpeg = _encode_jpeg(frame, quality)
+    if jpeg is not None:
+        if stream_id not in shared_state.encoded_jpeg:
+            shared_state.encoded_jpeg[stream_id] = shared_state.LatestSlot()
+        shared_state.encoded_jpeg[stream_id].put(_multipart_chunk(jpeg))
+
 def stream_feeder():
     """Pulls the latest processed frame from each pipeline for web display."""
     while not shared_state.shutdown_requested.is_set():
@@ -57,92 +143,192 @@ def stream_feeder():
             time.sleep(0.1)
             continue
 
-        # 1. Pull from the final output queue of each camera pipeline
+        # Sleep until a pipeline publishes a new view frame. Clearing before the
+        # scan means an update that lands mid-scan re-arms the next wait.
+        shared_state.view_updated.wait(timeout=0.1)
+        shared_state.view_updated.clear()
+
+        # 1. Take the latest fully processed packet from each camera pipeline's view slot.
+        # This leaves the pipeline's output queues to their downstream consumers (e.g. fusion).
         for cam_id, pipeline in shared_state.pipelines.items():
-            # The final output queue contains the fully processed packet
-            final_queue_name = f"{cam_id}_{pipeline.config['pipeline'][-1]}_out"
-            if final_queue_name in pipeline.queues:
-                view_queue = pipeline.queues[final_queue_name]
-                if not view_queue.empty():
-                    try:
-                        data = view_queue.get_nowait()
-                        with shared_state.stream_data_lock:
-                            shared_state.stream_data[cam_id] = data
-                    except queue.Empty:
-                        pass
-
-        # 2. Pull from the fusion worker's final output queue
-        if not shared_state.fusion_view_queue.empty():
             try:
-                data = shared_state.fusion_view_queue.get_nowait()
-                with shared_state.stream_data_lock:
-                    shared_state.stream_data['fusion'] = data
+                data = pipeline.view_slot.get()
             except queue.Empty:
-                pass
+                continue
+            _publish_view(cam_id, data)
 
-        time.sleep(0.01)
+        # 2. Take the latest rendered frame from the fusion view slot
+        try:
+            _publish_view('fusion', shared_state.fusion_view_slot.get())
+        except queue.Empty:
+            pass
 
 def start_stream_feeder():
     """Starts the stream_feeder in a background thread."""
     threading.Thread(target=stream_feeder, daemon=True).start()
 
 
+# --- Web Server ---
+
+# Streaming responses (/stream, /record_status_sse) hold a server thread while open. They
+# are capped so the pool always keeps 'threads' free for ordinary requests.
+_stream_slots = threading.BoundedSemaphore(2 * config.WEB_SERVER_CONFIG.get('max_viewers', 8))
+
+
+class _StreamingBody:
+    """
+    The body of a streaming response. The WSGI server calls close() when the client goes
+    away or the stream ends, which frees the response's streaming slot. (A generator's own
+    finally block does not run if it is closed before it started, and with
+    direct_passthrough Werkzeug does not run Response.call_on_close callbacks.)
+    """
+    def __init__(self, gen):
+        self._gen = gen
+        self._closed = False
+
+    def __iter__(self):
+        return self._gen
+
+    def close(self):
+        self._gen.close()
+        if not self._closed:
+            self._closed = True
+            _stream_slots.release()
+
+
+def _streaming_response(gen, **kwargs):
+    """
+    Wraps a long-lived generator in a Response that holds a streaming slot until the
+    server closes it, or returns 503 when every slot is taken.
+    """
+    if not _stream_slots.acquire(blocking=False):
+        gen.close()
+        return Response('Too many open viewers', status=503, mimetype='text/plain')
+    return Response(_StreamingBody(gen), **kwargs)
+
+
+def make_web_server(host, port):
+    """
+    Builds the configured server without starting it and returns (serve, close):
+    serve() blocks the calling thread until close() is called from another one.
+    Uses waitress when configured and installed: its I/O thread does all socket writes,
+    so /stream workers only hand chunks over. Otherwise uses Flask's threaded server.
+    """
+    web_config = config.WEB_SERVER_CONFIG
+    if web_config.get('server') == 'waitress':
+        try:
+            import waitress
+        except ImportError:
+            print("[Web] waitress is not installed; using the Flask development server")
+        else:
+            # Every open tab holds two worker threads (its /stream and the status SSE)
+            # for as long as it is connected, on top of the threads for short requests.
+            # A small output buffer makes a slow client stall its own generator rather
+            # than queueing seconds of stale frames.
+            server = waitress.create_server(
+                app, host=host, port=port,
+                threads=web_config.get('threads', 8) + 2 * web_config.get('max_viewers', 8),
+                outbuf_high_watermark=1 << 20)
+
+            def close():
+                # Let the workers finish first: they wake the I/O loop through the server
+                server.task_dispatcher.shutdown()
+                server.close()  # run() returns once the open connections have closed
+
+            return server.run, close
+
+    from werkzeug.serving import make_server
+    server = make_server(host, port, app, threaded=True)
+
+    def close():
+        server.shutdown()
+        server.server_close()
+
+    return server.serve_forever, close
+
+
+def run_web_server(host, port):
+    """Serves the app, blocking the calling thread."""
+    serve, _ = make_web_server(host, port)
+    serve()
+
+
 # --- Web Routes ---
 
+# The stream list is fixed once the ApplicationManager has built the pipelines,
+# so the page is rendered on first request and served from this cache afterwards.
+_page_html = None
+
 @app.route('/')
 def index():
     """Renders the main page, passing the list of available stream IDs."""
-    stream_ids = sorted(list(shared_state.pipelines.keys()))
-    if hasattr(shared_state, 'fusion_worker') and shared_state.fusion_worker:
-        stream_ids.append('fusion')
-    
-    return render_template('index.html', stream_ids=stream_ids)
+    global _page_html
+    if _page_html is None:
+        stream_ids = sorted(list(shared_state.pipelines.keys()))
+        if hasattr(shared_state, 'fusion_worker') and shared_state.fusion_worker:
+            stream_ids.append('fusion')
+        _page_html = render_template('index.html', stream_ids=stream_ids)
+
+    return Response(_page_html, mimetype='text/html', headers={'Cache-Control': 'no-store'})
 
 
 @app.route('/stream/<stream_id>')
 def stream(stream_id):
     """A dynamic route to serve the video stream for any given camera ID."""
     def gen():
-        while not shared_state.shutdown_requested.is_set():
-            frame_to_stream = None
-            with shared_state.stream_data_lock:
-                stream_packet = shared_state.stream_data.get(stream_id)
-                if stream_packet:
-                    frame_to_stream = stream_packet.get('outlined')
-            
-            if frame_to_stream is not None:
-                ret, jpeg = cv2.imencode('.jpg', frame_to_stream)
-                if ret:
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n')
-            time.sleep(0.01)
-
-    return Response(gen(), mimetype='multipart/x-mixed-replace; boundary=frame')
+        with shared_state.jpeg_consumers_lock:
+            shared_state.jpeg_consumers[stream_id] += 1
+        adaptive = config.WEB_SERVER_CONFIG.get('adaptive_jpeg_quality', False)
+        try:
+            seq = 0
+            received = send_s = None
+            while not shared_state.shutdown_requested.is_set():
+                # The feeder encodes each new frame once; clients block until the next one.
+                jpeg_slot = shared_state.encoded_jpeg.get(stream_id)
+                if jpeg_slot is None:
+                    time.sleep(0.1)  # Nothing has been encoded for this stream yet
+                    continue
+
+                last_seq = seq
+                seq, chunk = jpeg_slot.wait_newer(seq, timeout=1.0)
+                if chunk is not None:
+                    now = time.monotonic()
+                    if adaptive and received is not None:
+                        # Only this client's own write time counts: a gap in sequence numbers
+                        # can also come from the feeder or this thread being scheduled late.
+                        # The frame interval is measured over the frames published meanwhile.
+                        _adapt_jpeg_quality(stream_id, send_s > (now - received) / (seq - last_seq))
+                    received = now
+                    # The whole multipart part is built once by the feeder, so every client
+                    # writes the same bytes object with one socket write and no copy.
+                    # The yield returns once the server has taken the chunk, which blocks
+                    # while this client's socket is backed up.
+                    yield chunk
+                    send_s = time.monotonic() - received
+        finally:
+            with shared_state.jpeg_consumers_lock:
+                shared_state.jpeg_consumers[stream_id] -= 1
+
+    return _streaming_response(gen(), mimetype='multipart/x-mixed-replace; boundary=frame', direct_passthrough=True)
 
 
 # --- Control Routes ---
 
 @app.route('/align', methods=['POST'])
 def align_cameras():
-    """Pauses the feeder and gets fresh frames to estimate camera alignment."""
-    with feeder_paused_context():
-        try:
-            # Get the final output queues for the source cameras
-            cam1_q_name = f"cam1_{shared_state.pipelines['cam1'].config['pipeline'][-1]}_out"
-            cam2_q_name = f"cam2_{shared_state.pipelines['cam2'].config['pipeline'][-1]}_out"
-            cam1_q = shared_state.pipelines['cam1'].queues[cam1_q_name]
-            cam2_q = shared_state.pipelines['cam2'].queues[cam2_q_name]
-
-            # Clear any stale frames
-            while not cam1_q.empty(): cam1_q.get_nowait()
-            while not cam2_q.empty(): cam2_q.get_nowait()
-
-            # Get the latest raw frames directly from the queues
-            mov_img = cam1_q.get(timeout=1.0)['raw_frame']
-            ref_img = cam2_q.get(timeout=1.0)['raw_frame']
-
-        except (KeyError, queue.Empty) as e:
-            return jsonify({'status': 'error', 'message': f'Could not get fresh frames: {e}'}), 503
+    """Waits for fresh frames from both source cameras to estimate camera alignment."""
+    try:
+        # Take the next frames published to the pipelines' view slots. Unlike draining
+        # the output queues, this steals nothing from fusion or the web view.
+        cam1_data = shared_state.pipelines['cam1'].view_slot.wait_next(timeout=1.0)
+        cam2_data = shared_state.pipelines['cam2'].view_slot.wait_next(timeout=1.0)
+        if cam1_data is None or cam2_data is None:
+            raise queue.Empty('timed out waiting for a new frame')
+        mov_img = cam1_data['raw_frame']
+        ref_img = cam2_data['raw_frame']
+
+    except (KeyError, queue.Empty) as e:
+        return jsonify({'status': 'error', 'message': f'Could not get fresh frames: {e}'}), 503
 
     dx, dy = estimate_shift(ref_img, mov_img)
     print(f'[Align] Estimated offsets: dx={dx}, dy={dy}')
@@ -179,4 +365,22 @@ def record_status():
     return jsonify(get_status())
 
 
-__all__ = ['app', 'start_stream_feeder']
+@app.route('/record_status_sse')
+def record_status_sse():
+    """
+    Pushes the recording status as Server-Sent Events: immediately when a recording
+    starts or finishes, about once a second while any is active for the progress bars,
+    and as a keep-alive every 20 seconds when idle.
+    """
+    def gen():
+        seq = 0
+        while not shared_state.shutdown_requested.is_set():
+            status = get_status()
+            yield f"data: {json.dumps(status)}\n\n".encode()
+            seq, _ = status_updates.wait_newer(seq, timeout=1.0 if status else 20.0)
+
+    return _streaming_response(gen(), mimetype='text/event-stream',
+                               headers={'Cache-Control': 'no-cache'}, direct_passthrough=True)
+
+
+__all__ = ['app', 'start_stream_feeder', 'make_web_server', 'run_web_server']
@@ -5,7 +5,7 @@ Defines the FusionWorker thread. Its role has been simplified to only
 synchronize and fuse the grayscale images from two sources.
 
 Responsibilities:
-- Continuously polls its source queues for the latest available frames.
+- Waits on its source queues for the latest available frames.
 - Fuses the two grayscale images.
 - Packages the fused image, contours, and colors into an intermediate packet
   for the FinalProcessor.
@@ -18,6 +18,7 @@ import queue
 import cv2
 
 from shared_state import shutdown_requested
+from workers import BufferRing, pin_current_thread
 
 class FusionWorker(threading.Thread):
     def __init__(self, fusion_config, input_queues, output_queue):
@@ -29,7 +30,14 @@ class FusionWorker(threading.Thread):
         self.source_ids = self.config.get('sources', [])
         self.overlap_trim_x = self.config.get('overlap_trim_x', 0)
         self.overlap_trim_y = self.config.get('overlap_trim_y', 0)
+        # The crop windows only depend on the trims, so they are worked out once
+        self.crop1, self.crop2 = self._crop_windows(self.overlap_trim_x, self.overlap_trim_y)
         
+        # Padded frames are recycled: the queued ones, the one the FinalProcessor is
+        # working on, and the one being written here.
+        self.buffers = BufferRing(depth=output_queue.maxsize + 2,
+                                  factory=lambda shape: np.empty(shape, dtype=np.uint8))
+
         self.running = True
         self.frame_counter = 0
 
@@ -37,6 +45,7 @@ class FusionWorker(threading.Thread):
         self.running = False
 
     def run(self):
+        pin_current_thread(self.name, self.config.get('cpu_affinity'))
         if len(self.source_ids) != 2:
             print("[FusionWorker] Error: Fusion requires exactly two sources.")
             return
@@ -47,13 +56,26 @@ class FusionWorker(threading.Thread):
 
         latest_data1 = None
         latest_data2 = None
-
-        while self.running and not shutdown_requested.is_set():
+        shutdown_is_set = shutdown_requested.is_set
+
+        while self.running and not shutdown_is_set():
+            # Block on whichever source is still missing a frame instead of polling
+            if latest_data1 is None:
+                try:
+                    latest_data1 = cam1_q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            if latest_data2 is None:
+                try:
+                    latest_data2 = cam2_q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+            # Swap in anything newer that arrived meanwhile, so the pair is as fresh as possible
             try:
                 latest_data1 = cam1_q.get_nowait()
             except queue.Empty:
                 pass
-
             try:
                 latest_data2 = cam2_q.get_nowait()
             except queue.Empty:
@@ -65,64 +87,57 @@ class FusionWorker(threading.Thread):
 
                 # Fuse the raw grayscale images
                 img1, img2 = self.crop_and_shift(data1['gray_frame'], data2['gray_frame'])
-                mask1, _ = self.crop_and_shift(data1['mask'], data2['mask'])
-                fused_gray = self.fuse_images(img1, img2, mask1)
-                padded_fused_gray = self.pad_to_full_width(fused_gray)
+                # Only cam1's mask is used, so cam2's is never sliced
+                mask1 = data1['mask'][self.crop1]
+                padded_fused_gray = self.fuse_and_pad(img1, img2, mask1)
 
                 # Prepare the intermediate data packet for the FinalProcessor
                 output_data = {
-                    'timestamp': time.time(),
+                    'timestamp': time.monotonic_ns(),
                     'fused_gray': padded_fused_gray,
-                    'contours1': self.shift_contours(data1['contours'], dx=0, dy=0),
-                    'contours2': self.shift_contours(data2['contours'], dx=self.overlap_trim_x, dy=self.overlap_trim_y),
+                    # cam1 keeps its own coordinates in the padded frame, so its contours pass through
+                    'contours1': data1['contours'],
+                    'contours2': data2['contours'],
+                    # cam2's contours are shifted into the fused frame when drawn (drawContours offset=)
+                    'offset2': (self.overlap_trim_x, self.overlap_trim_y),
                     'color1': data1.get('overlay_color', (255, 0, 0)),
                     'color2': data2.get('overlay_color', (0, 0, 255)),
                 }
 
-                if self.output_queue.full():
-                    try: self.output_queue.get_nowait()
-                    except queue.Empty: pass
+                # A LatestQueue: the put replaces any fused frame not yet rendered
                 self.output_queue.put(output_data)
                 self.frame_counter += 1
 
                 latest_data1 = None
                 latest_data2 = None
-            else:
-                time.sleep(0.005)
 
-    def crop_and_shift(self, img1, img2):
-        x = self.overlap_trim_x
-        y = self.overlap_trim_y
-        img1_x = img1[:, x:]
-        img2_x = img2[:, :-x or None]
+    @staticmethod
+    def _crop_windows(x, y):
+        """Returns the (rows, cols) slices that align the two images for the given overlap trims."""
+        cols1, cols2 = slice(x, None), slice(None, -x or None)
         if y > 0:
-            img1_cropped = img1_x[y:, :]
-            img2_cropped = img2_x[:-y or None, :]
+            rows1, rows2 = slice(y, None), slice(None, -y)
         elif y < 0:
-            y = abs(y)
-            img1_cropped = img1_x[:-y or None, :]
-            img2_cropped = img2_x[y:, :]
+            rows1, rows2 = slice(None, y), slice(-y, None)
         else:
-            img1_cropped = img1_x
-            img2_cropped = img2_x
-        return img1_cropped, img2_cropped
-
-    def fuse_images(self, img1, img2, mask1):
-        fused = img1.copy()
-        fused[mask1 > 0] = img2[mask1 > 0]
-        return fused
+            rows1 = rows2 = slice(None)
+        return (rows1, cols1), (rows2, cols2)
 
-    def pad_to_full_width(self, cropped_img):
-        h, w = cropped_img.shape[:2]
+    def crop_and_shift(self, img1, img2):
+        # A single 2-D slice per image gives each crop as one view
+        return img1[self.crop1], img2[self.crop2]
+
+    def fuse_and_pad(self, img1, img2, mask1):
+        """
+        Blends img2 into img1 wherever mask1 is set, directly inside a frame padded
+        back to full width with gray (128) side columns. Writing the blend in place
+        saves the separate fused frame and the copy into the padded one.
+        """
+        h, w = img1.shape[:2]
         x = self.overlap_trim_x
-        full_w = w + 2 * x
-        padded = np.full((h, full_w), 128, dtype=np.uint8)
-        padded[:, x:x + w] = cropped_img
+        # One pass writes the gray border and copies img1 into the middle
+        padded = cv2.copyMakeBorder(img1, 0, 0, x, x, cv2.BORDER_CONSTANT,
+                                    dst=self.buffers.next((h, w + 2 * x)), value=128)
+        # OpenCV's masked copy blends in one vectorized pass, straight from the uint8 mask
+        cv2.copyTo(img2, mask1, padded[:, x:x + w])
         return padded
-
-    def shift_contours(self, contours, dx=0, dy=0):
-        shifted = []
-        for cnt in contours:
-            cnt_shifted = cnt + np.array([[[dx, dy]]], dtype=cnt.dtype)
-            shifted.append(cnt_shifted)
-        return shifted
@@ -0,0 +1,65 @@
+"""
+kernels.py
+
+Optional Numba-compiled pixel kernels for the per-frame hot paths.
+
+Numba is not a hard requirement. When it is not installed HAVE_NUMBA is False and
+the workers keep using their OpenCV implementations. The kernels are serial and run
+with the GIL released: each camera's ContourProcessor thread calls them at the same
+time, so the parallelism comes from the per-camera threads. (Numba's parallel=True
+backends do not support concurrent calls from several threads: the workqueue layer
+aborts the process and TBB hangs at interpreter exit.)
+
+Functions:
+- mask_and_outline(gray, threshold, color, mask_out, outlined_out):
+    In one pass, thresholds a grayscale frame into a saturation mask and renders
+    the BGR view with the mask boundary painted in the overlay color. The result
+    matches cv2.inRange + a 3x3 MORPH_GRADIENT outline.
+"""
+
+try:
+    import numba
+    HAVE_NUMBA = True
+except ImportError:
+    numba = None
+    HAVE_NUMBA = False
+
+
+if HAVE_NUMBA:
+    @numba.njit(nogil=True, cache=True)
+    def _mask_and_outline(gray, threshold, b, g, r, mask_out, outlined_out):
+        h, w = gray.shape
+        for y in range(h):
+            y0 = max(y - 1, 0)
+            y1 = min(y + 2, h)
+            for x in range(w):
+                v = gray[y, x]
+                mask_out[y, x] = 255 if v >= threshold else 0
+
+                # A pixel is on the boundary when its 3x3 neighbourhood holds both
+                # saturated and unsaturated pixels (what MORPH_GRADIENT marks).
+                x0 = max(x - 1, 0)
+                x1 = min(x + 2, w)
+                any_set = False
+                any_clear = False
+                for yy in range(y0, y1):
+                    for xx in range(x0, x1):
+                        if gray[yy, xx] >= threshold:
+                            any_set = True
+                        else:
+                            any_clear = True
+
+                if any_set and any_clear:
+                    outlined_out[y, x, 0] = b
+                    outlined_out[y, x, 1] = g
+                    outlined_out[y, x, 2] = r
+                else:
+                    outlined_out[y, x, 0] = v
+                    outlined_out[y, x, 1] = v
+                    outlined_out[y, x, 2] = v
+
+
+def mask_and_outline(gray, threshold, color, mask_out, outlined_out):
+    """Fills mask_out and outlined_out from a grayscale frame in a single compiled pass."""
+    _mask_and_outline(gray, threshold, color[0], color[1], color[2], mask_out, outlined_out)
+    return mask_out, outlined_out
@@ -13,7 +13,6 @@ import signal
 import time
 import sys
 import threading
-import queue
 
 # Import application modules
 import config
@@ -21,7 +20,7 @@ import shared_state
 from pipeline import CameraPipeline
 from fusion_worker import FusionWorker
 from workers import FinalProcessor
-from flask_server import app, start_stream_feeder
+from flask_server import run_web_server, start_stream_feeder
 from utils import monitor_fps, shutdown_handler_factory
 
 class ApplicationManager:
@@ -36,10 +35,16 @@ class ApplicationManager:
         shared_state.fusion_worker = None
         shared_state.final_processor = None # For FPS monitor discovery
 
+        # Only cameras feeding the fusion pipeline need vector contours
+        fusion_sources = set()
+        if self.config.FUSION_CONFIG.get('enabled', False):
+            fusion_sources = set(self.config.FUSION_CONFIG.get('sources', []))
+
         print("[Manager] Building camera pipelines from configuration...")
         for cam_config in self.config.CAMERAS:
             if cam_config.get('enabled', False):
                 cam_id = cam_config['id']
+                cam_config = {**cam_config, 'emit_contours': cam_config.get('emit_contours', cam_id in fusion_sources)}
                 self.pipelines[cam_id] = CameraPipeline(cam_config)
 
         # --- Fusion Pipeline Instantiation (FusionWorker -> FinalProcessor) ---
@@ -63,8 +68,9 @@ class ApplicationManager:
                     break
             
             if len(input_queues) == len(source_ids):
-                # Create the intermediate queue between FusionWorker and FinalProcessor
-                fusion_to_final_q = queue.Queue(maxsize=2)
+                # Create the link between FusionWorker and FinalProcessor. The render is for
+                # display only, so it takes the newest fused frame rather than a backlog.
+                fusion_to_final_q = shared_state.LatestQueue()
 
                 self.fusion_worker = FusionWorker(
                     fusion_config=self.config.FUSION_CONFIG,
@@ -75,8 +81,10 @@ class ApplicationManager:
                     name='FinalProcessor',
                     fusion_config=self.config.FUSION_CONFIG,
                     input_queue=fusion_to_final_q,
-                    output_queue=shared_state.fusion_view_queue
                 )
+                # The final fused frame only ever goes to the web view, so it is published
+                # to a single latest-frame slot rather than a queue.
+                self.final_processor.view_slot = shared_state.fusion_view_slot
                 # Make workers globally accessible for the FPS monitor
                 shared_state.fusion_worker = self.fusion_worker
                 shared_state.final_processor = self.final_processor
@@ -100,7 +108,8 @@ class ApplicationManager:
 
         print("[Manager] Starting Flask web server...")
         self.web_server_thread = threading.Thread(
-            target=lambda: app.run(host='0.0.0.0', port=self.config.WEB_SERVER_CONFIG.get('port', 5000)),
+            target=run_web_server,
+            args=('0.0.0.0', self.config.WEB_SERVER_CONFIG.get('port', 5000)),
             daemon=True
         )
         self.web_server_thread.start()
@@ -6,6 +6,7 @@ workers and queues for a single camera's processing chain.
 """
 
 import queue
+from shared_state import LatestSlot, LatestQueue
 from workers import FrameGrabber, ContourProcessor
 
 # A mapping from pipeline step names in the config to worker classes
@@ -20,6 +21,8 @@ class CameraPipeline:
         self.config = camera_config
         self.workers = []
         self.queues = {}
+        # Latest fully processed packet, for the web view only
+        self.view_slot = LatestSlot()
 
         self._build_pipeline()
 
@@ -30,9 +33,10 @@ class CameraPipeline:
             return
 
         # The first worker is always a FrameGrabber
-        # Its output queue is the first link in the chain.
+        # Its output queue is the first link in the chain. The processor only ever wants
+        # the newest grab, so the link holds a single frame that each grab replaces.
         grabber_out_q_name = f"{self.id}_grabber_out"
-        last_output_q = queue.Queue(maxsize=2)
+        last_output_q = LatestQueue()
         self.queues[grabber_out_q_name] = last_output_q
         
         frame_grabber = FrameGrabber(name=self.id, camera_config=self.config, output_queue=last_output_q)
@@ -46,7 +50,8 @@ class CameraPipeline:
                 continue
 
             output_q_name = f"{self.id}_{step_name}_out"
-            output_q = queue.Queue(maxsize=2)
+            # Downstream consumers such as fusion get 'queue_depth' frames of slack (oldest dropped)
+            output_q = queue.Queue(maxsize=self.config.get('queue_depth', 2))
             self.queues[output_q_name] = output_q
 
             worker = worker_class(
@@ -58,6 +63,9 @@ class CameraPipeline:
             self.workers.append(worker)
             last_output_q = output_q
 
+        # The last worker in the chain feeds the web view
+        self.workers[-1].view_slot = self.view_slot
+
         print(f"[Pipeline] Built pipeline for '{self.id}' with {len(self.workers)} workers.")
 
     def start(self):
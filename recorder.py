@@ -9,20 +9,90 @@ Responsibilities:
 - Manages the state of multiple, simultaneous recordings.
 - Provides a public API to start recordings for any given stream ID and frame type.
 - Provides a public API to get the status of all active recordings.
+- Signals status listeners when a recording starts or finishes.
+- Encodes clips through an ffmpeg pipe when available, otherwise with cv2.VideoWriter.
+- Records 'outlined' clips by muxing the web stream's JPEGs, without encoding them again.
 """
 
 import os
 import time
+import shutil
+import subprocess
 from datetime import datetime
 import cv2
+import numpy as np
 import threading
 
+import config
 import shared_state
+from workers import BufferRing
 
 # --- Module State ---
 active_recordings = {}
 active_recordings_lock = threading.Lock()
 
+# Bumped whenever a recording starts or finishes, so status listeners can block until
+# something changes instead of polling.
+status_updates = shared_state.LatestSlot()
+
+
+# --- Video Writers ---
+
+class _FFmpegWriter:
+    """
+    Pipes frames to an ffmpeg subprocess, so encoding runs outside the Python
+    process (and on dedicated hardware with encoders like h264_v4l2m2m or h264_nvenc).
+    Mirrors the cv2.VideoWriter methods the recorder uses.
+    """
+    def __init__(self, out_path, input_args, output_args):
+        cmd = ['ffmpeg', '-y', '-loglevel', 'error', *input_args, '-i', '-', *output_args, out_path]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+
+    def isOpened(self):
+        return self.proc.poll() is None
+
+    def write(self, frame):
+        # Pipe writes block while ffmpeg is busy, so callers pass frames they own
+        # (the recorder copies each frame out of the pipeline's recycled buffers)
+        self.proc.stdin.write(np.ascontiguousarray(frame).data)
+
+    def release(self):
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.proc.wait()
+
+
+def _open_writer(out_path, fps, frame_size, is_color=True):
+    """
+    Opens an ffmpeg-pipe writer if configured and ffmpeg is on PATH, else an OpenCV mp4v writer.
+    With is_color=False the writer takes single-channel frames directly.
+    """
+    rec_config = config.RECORDER_CONFIG
+    codec = rec_config.get('ffmpeg_codec')
+    if codec and shutil.which('ffmpeg'):
+        w, h = frame_size
+        return _FFmpegWriter(
+            out_path,
+            input_args=['-f', 'rawvideo', '-pix_fmt', 'bgr24' if is_color else 'gray',
+                        '-s', f'{w}x{h}', '-r', str(fps)],
+            # 4:2:0 output needs even dimensions; the fused view can be odd-sized.
+            output_args=['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                         '-c:v', codec, *rec_config.get('ffmpeg_codec_args', ()), '-pix_fmt', 'yuv420p'],
+        )
+    return cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, frame_size, is_color)
+
+
+def _open_jpeg_muxer(out_path, fps):
+    """Opens an ffmpeg writer that stores already-encoded JPEGs as an MJPEG clip, with no re-encode."""
+    return _FFmpegWriter(out_path, input_args=['-f', 'mjpeg', '-framerate', str(fps)], output_args=['-c:v', 'copy'])
+
+
+def _jpeg_payload(chunk):
+    """Returns the JPEG inside a /stream multipart chunk (see shared_state.encoded_jpeg), without copying it."""
+    return memoryview(chunk)[chunk.index(b'\r\n\r\n') + 4:-2]
+
 
 # --- Private Recording Worker ---
 
@@ -33,11 +103,28 @@ def _record_stream(stream_id, frame_type='outlined', duration_s=10.0, target_fps
     # Make the filename more descriptive
     out_path = os.path.join("clips", f"{stream_id}_{frame_type}_{ts}.mp4")
 
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
     writer = None
+    newest = None  # Newest frame received and not yet written
+    last = None    # Last frame written
     frames_written = 0
+    seq = 0
+    size_warned = False
+    frame_key = None
     dt = 1.0 / float(target_fps)
-    t0 = time.time()
+    # Monotonic clock: wall-clock adjustments cannot stretch or cut a recording
+    t0 = time.monotonic()
+    next_t = None  # Deadline of the next frame; the clip's clock starts at its first frame
+
+    # The web view JPEG-encodes 'outlined' frames anyway, so with ffmpeg available the
+    # recording takes those JPEGs (registering as a consumer so they are produced) and
+    # only muxes them into the clip.
+    mux_jpeg = (frame_type == 'outlined' and config.RECORDER_CONFIG.get('mux_stream_jpeg', False)
+                and shutil.which('ffmpeg') is not None)
+    slots = shared_state.encoded_jpeg if mux_jpeg else shared_state.stream_data
+    if mux_jpeg:
+        with shared_state.jpeg_consumers_lock:
+            shared_state.jpeg_consumers[stream_id] += 1
+            shared_state.jpeg_recorders[stream_id] += 1
 
     with active_recordings_lock:
         active_recordings[stream_id] = {
@@ -46,38 +133,84 @@ def _record_stream(stream_id, frame_type='outlined', duration_s=10.0, target_fps
             'duration': float(duration_s),
             'filename': out_path
         }
+    status_updates.put(stream_id)
 
     try:
-        while time.time() - t0 < duration_s:
+        while time.monotonic() - t0 < duration_s:
             if shared_state.shutdown_requested.is_set():
                 break
 
-            frame_to_write = None
-            with shared_state.stream_data_lock:
-                packet = shared_state.stream_data.get(stream_id)
-                if packet:
-                    # Dynamically get the requested frame type
-                    frame_to_write = packet.get(frame_type)
-                    # Failsafe: if requested type doesn't exist, fall back to 'outlined'
-                    if frame_to_write is None:
-                        frame_to_write = packet.get('outlined')
-
-            if frame_to_write is not None:
-                if writer is None:
-                    h, w = frame_to_write.shape[:2]
-                    writer = cv2.VideoWriter(out_path, fourcc, target_fps, (w, h))
-                    if not writer.isOpened():
-                        print(f"[Recorder] Failed to open writer for {out_path}")
-                        break
-                
-                if len(frame_to_write.shape) == 2:
-                    frame_bgr = cv2.cvtColor(frame_to_write, cv2.COLOR_GRAY2BGR)
+            slot = slots.get(stream_id)
+            if slot is None:
+                time.sleep(dt)  # The stream has not produced a packet yet
+                continue
+
+            # Block until the stream publishes a new packet (or the next frame is due)
+            seq, packet = slot.wait_newer(seq, timeout=dt)
+
+            if packet is not None:
+                if mux_jpeg:
+                    # The chunk is an immutable bytes object, so it can be held without copying
+                    newest = _jpeg_payload(packet)
+                    if writer is None:
+                        writer = _open_jpeg_muxer(out_path, target_fps)
+                        write = writer.write
                 else:
-                    frame_bgr = frame_to_write
-                writer.write(frame_bgr)
-                frames_written += 1
+                    if frame_key is None:
+                        # Resolve which packet entry to record once, from the first packet.
+                        # Failsafe: if requested type doesn't exist, fall back to 'outlined'
+                        frame_key = frame_type if packet.get(frame_type) is not None else 'outlined'
+                    frame = packet.get(frame_key)
+                    if frame is None:
+                        continue
 
-            time.sleep(dt)
+                    if writer is None:
+                        # The writer takes frames in their native layout, so grayscale
+                        # frames are never expanded to three channels
+                        latched_shape = frame.shape
+                        h, w = latched_shape[:2]
+                        writer = _open_writer(out_path, target_fps, (w, h), frame.ndim == 3)
+                        if not writer.isOpened():
+                            print(f"[Recorder] Failed to open writer for {out_path}")
+                            break
+                        write = writer.write
+                        # The packet's buffers are recycled by the pipeline, so frames are
+                        # copied into the recorder's own: one for the newest frame not yet
+                        # written, one for the last frame written (repeated if no new one comes).
+                        own_buffers = BufferRing(depth=2, factory=lambda shape: np.empty(shape, dtype=np.uint8))
+
+                    if frame.shape[:2] != (h, w):
+                        # A size change mid-clip would corrupt the raw ffmpeg stream; drop the frame
+                        if not size_warned:
+                            print(f"[Recorder] Frame size changed during '{stream_id}' recording; dropping mismatched frames")
+                            size_warned = True
+                        continue
+                    # A newer packet before the frame was due replaces it in the same buffer
+                    if newest is None:
+                        newest = own_buffers.next(latched_shape)
+                    if frame.shape == latched_shape:
+                        np.copyto(newest, frame)
+                    else:
+                        # The packet's frame layout changed mid-recording
+                        code = cv2.COLOR_BGR2GRAY if frame.ndim == 3 else cv2.COLOR_GRAY2BGR
+                        cv2.cvtColor(frame, code, dst=newest)
+
+            # Pace writes against absolute deadlines, one frame every dt, so the clip plays
+            # back at real speed. Each due deadline takes the newest frame received; packets
+            # that arrive early are replaced by later ones, and deadlines that pass with no
+            # new packet (a source slower than target_fps, or a stalled writer) repeat the
+            # last frame written.
+            now = time.monotonic()
+            if next_t is None:
+                if newest is None:
+                    continue  # Nothing received yet
+                next_t = now
+            while next_t <= now + 0.5 * dt:
+                if newest is not None:
+                    last, newest = newest, None
+                write(last)
+                frames_written += 1
+                next_t += dt
 
         print(f"[Recorder] Saved {frames_written} frames to {out_path}")
 
@@ -86,9 +219,14 @@ def _record_stream(stream_id, frame_type='outlined', duration_s=10.0, target_fps
     finally:
         if writer is not None:
             writer.release()
+        if mux_jpeg:
+            with shared_state.jpeg_consumers_lock:
+                shared_state.jpeg_consumers[stream_id] -= 1
+                shared_state.jpeg_recorders[stream_id] -= 1
         with active_recordings_lock:
             if stream_id in active_recordings:
                 del active_recordings[stream_id]
+        status_updates.put(stream_id)
 
 
 # --- Public API for the Flask Server ---
@@ -116,16 +254,19 @@ def start_recording(stream_id, frame_type='outlined', duration_s=10.0, target_fp
 
 def get_status():
     """Returns the status of all active recordings."""
+    # The lock only serialises starting and finishing recordings. Each state dict is
+    # built once and never mutated, and dict.copy() is atomic under CPython's GIL, so
+    # status polling takes a snapshot without contending with the recorder threads.
+    snapshot = active_recordings.copy()
     status_report = {}
-    with active_recordings_lock:
-        for stream_id, state in active_recordings.items():
-            status_report[stream_id] = {
-                'active': state['active'],
-                'duration': state['duration'],
-                'remaining': max(0.0, state['duration'] - (time.time() - state['t_start'])),
-                'filename': state['filename']
-            }
+    for stream_id, state in snapshot.items():
+        status_report[stream_id] = {
+            'active': state['active'],
+            'duration': state['duration'],
+            'remaining': max(0.0, state['duration'] - (time.monotonic() - state['t_start'])),
+            'filename': state['filename']
+        }
     return status_report
 
 
-__all__ = ['start_recording', 'get_status']
+__all__ = ['start_recording', 'get_status', 'status_updates']
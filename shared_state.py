@@ -6,12 +6,15 @@ This has been refactored to support a generic, scalable pipeline architecture.
 
 Responsibilities:
 - Defines the global shutdown event.
-- Defines an event to control the web stream feeder.
+- Defines events to control and wake the web stream feeder.
 - Defines the global data structures for pipeline management and web streaming.
+- Defines LatestSlot, a single-slot holder for "latest frame only" hand-offs.
+- Defines LatestQueue, a depth-one, overwrite-on-put stand-in for queue.Queue.
 """
 
 import threading
 import queue
+import collections
 
 # --- Global Shutdown Event ---
 shutdown_requested = threading.Event()
@@ -22,6 +25,100 @@ shutdown_requested = threading.Event()
 # without contention from the web view feeder.
 feeder_paused = threading.Event()
 
+# --- View Update Event ---
+# Set by the final worker of each pipeline whenever it publishes a new view frame,
+# so the stream_feeder can sleep until there is actually something to display.
+view_updated = threading.Event()
+
+
+# --- Latest-Frame Slot ---
+
+class LatestSlot:
+    """
+    Holds only the most recent item put into it.
+    Used where a consumer only ever wants the newest frame (e.g. the web view),
+    so no drop-oldest handling is needed. Each put is numbered so consumers can
+    block until something newer than what they last saw arrives.
+    """
+    def __init__(self):
+        # Holds a single (seq, item) pair; reading it back needs no lock
+        self._slot = collections.deque(maxlen=1)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            self._seq += 1
+            self._slot.append((self._seq, item))
+            self._cond.notify_all()
+
+    def get(self):
+        """Returns the latest item without removing it. Raises queue.Empty if none has been put."""
+        try:
+            return self._slot[-1][1]
+        except IndexError:
+            raise queue.Empty from None
+
+    def wait_newer(self, last_seq, timeout=None):
+        """
+        Waits for an item newer than last_seq (0 before the first item).
+        Returns (seq, item), or (last_seq, None) if the wait timed out.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq != last_seq, timeout):
+                return last_seq, None
+            return self._slot[-1]
+
+    def wait_next(self, timeout=None):
+        """Waits for the next item put after this call. Returns it, or None if the wait timed out."""
+        with self._cond:
+            seq = self._seq
+            if not self._cond.wait_for(lambda: self._seq != seq, timeout):
+                return None
+            return self._slot[-1][1]
+
+
+class LatestQueue:
+    """
+    A queue.Queue stand-in of depth one, for single-consumer links where only the
+    newest frame matters. put() replaces any item not yet taken instead of blocking,
+    so it is never full and producers need no drop-oldest handling. Unlike LatestSlot,
+    get() consumes the item, blocking until one arrives.
+    """
+    maxsize = 1
+
+    def __init__(self):
+        # deque append/popleft are atomic, so only the consumer's wake-up needs an Event
+        self._slot = collections.deque(maxlen=1)
+        self._ready = threading.Event()
+
+    def put(self, item):
+        self._slot.append(item)
+        self._ready.set()
+
+    def full(self):
+        return False
+
+    def empty(self):
+        return not self._slot
+
+    def get(self, block=True, timeout=None):
+        # Clearing before the check means a put that lands after it re-arms the wait
+        self._ready.clear()
+        try:
+            return self._slot.popleft()
+        except IndexError:
+            pass
+        if block and self._ready.wait(timeout):
+            try:
+                return self._slot.popleft()
+            except IndexError:
+                pass
+        raise queue.Empty
+
+    def get_nowait(self):
+        return self.get(block=False)
+
 
 # --- Global Data Structures ---
 
@@ -29,10 +126,25 @@ feeder_paused = threading.Event()
 # This is populated by the ApplicationManager at startup.
 pipelines = {}
 
-# A dedicated queue for the FusionWorker's output, to be consumed by the web feeder.
-fusion_view_queue = queue.Queue(maxsize=2)
+# The latest rendered fusion frame (from the FinalProcessor), read by the web feeder.
+fusion_view_slot = LatestSlot()
 
 # A dictionary to hold the latest processed frame data for web streaming,
 # keyed by stream ID (e.g., 'cam1', 'cam2', 'fusion').
+# Each entry is a LatestSlot created and filled only by the stream feeder, with whole,
+# fully built packets, so readers need no lock and can block until a new packet arrives.
 stream_data = {}
-stream_data_lock = threading.Lock()
+
+# The latest JPEG-encoded view of each stream, keyed by stream ID, already wrapped
+# in its multipart part (boundary, headers, trailing CRLF) for /stream.
+# Each entry is a LatestSlot filled once per new frame by the stream feeder,
+# so all web clients of a stream share a single encode and a single buffer.
+encoded_jpeg = {}
+
+# Number of consumers of encoded_jpeg (connected /stream clients and JPEG-muxing
+# recordings) per stream ID. Frames are only JPEG-encoded for streams that have one.
+jpeg_consumers = collections.Counter()
+# How many of those consumers are recordings. While a stream has any, it is encoded
+# at the configured quality, whatever the adaptive quality for its viewers is.
+jpeg_recorders = collections.Counter()
+jpeg_consumers_lock = threading.Lock()
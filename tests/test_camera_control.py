@@ -0,0 +1,42 @@
+"""
+Tests how auto-exposure picks frames taken after a setting changed.
+Run from the repository root with: python -m unittest discover -s tests -t .
+"""
+
+import queue
+import time
+import unittest
+
+import camera_control
+
+
+class _FakeSlot:
+    """Hands out the given frames in order through LatestSlot.wait_newer, then times out."""
+
+    def __init__(self, frames):
+        self._frames = list(frames)
+        self.timeouts = []
+
+    def wait_newer(self, last_seq, timeout=None):
+        self.timeouts.append(timeout)
+        if last_seq < len(self._frames):
+            return last_seq + 1, self._frames[last_seq]
+        time.sleep(timeout)
+        return last_seq, None
+
+
+class FreshFrameTest(unittest.TestCase):
+
+    def test_skips_frames_from_before_the_change(self):
+        slot = _FakeSlot([{'timestamp': 100}, {'timestamp': 199}, {'timestamp': 200}, {'timestamp': 300}])
+        self.assertEqual(camera_control._fresh_frame(slot, 200), {'timestamp': 200})
+
+    def test_raises_empty_without_a_fresh_frame(self):
+        slot = _FakeSlot([{'timestamp': 100}])
+        with self.assertRaises(queue.Empty):
+            camera_control._fresh_frame(slot, 200, timeout=0.05)
+        self.assertTrue(all(0 < t <= 0.05 for t in slot.timeouts), slot.timeouts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Tests that the streaming routes work under both web servers run_web_server can use.
+Run from the repository root with: python -m unittest discover -s tests -t .
+"""
+
+import json
+import socket
+import threading
+import time
+import unittest
+import urllib.request
+from unittest import mock
+
+import config
+import flask_server
+import shared_state
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class RecordStatusSSETest(unittest.TestCase):
+    """/record_status_sse must send its first event as soon as a client connects."""
+
+    def _read_first_event(self, server):
+        # A private status slot and shutdown flag let the cleanup end the open stream
+        status_updates = shared_state.LatestSlot()
+        shutdown_requested = threading.Event()
+        for patcher in (mock.patch.object(flask_server, 'status_updates', status_updates),
+                        mock.patch.object(shared_state, 'shutdown_requested', shutdown_requested)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        port = _free_port()
+        with mock.patch.dict(config.WEB_SERVER_CONFIG, {'server': server}):
+            serve, close = flask_server.make_web_server('127.0.0.1', port)
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        # Cleanups run last-added first: end the stream, stop the server, then wait for it
+        self.addCleanup(lambda: self.assertFalse(thread.is_alive(), 'server did not stop'))
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(close)
+        self.addCleanup(status_updates.put, None)
+        self.addCleanup(shutdown_requested.set)
+
+        url = f'http://127.0.0.1:{port}/record_status_sse'
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                response = urllib.request.urlopen(url, timeout=5)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)  # The server is still starting
+
+        with response:
+            self.assertEqual(response.headers.get_content_type(), 'text/event-stream')
+            line = response.readline()
+        self.assertTrue(line.startswith(b'data: '), line)
+        self.assertEqual(json.loads(line[len(b'data: '):]), {})
+
+    def test_waitress(self):
+        try:
+            import waitress  # noqa: F401
+        except ImportError:
+            self.skipTest('waitress is not installed')
+        self._read_first_event('waitress')
+
+    def test_flask_development_server(self):
+        self._read_first_event('flask')
+
+
+if __name__ == '__main__':
+    unittest.main()
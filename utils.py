@@ -10,12 +10,10 @@ def monitor_fps():
     last_counts = {}
     prev_time = time.time()
 
-    while not shared_state.shutdown_requested.is_set():
+    # Wake once a second to report; waiting on the shutdown event (rather than
+    # sleeping) also lets the monitor exit as soon as shutdown is requested.
+    while not shared_state.shutdown_requested.wait(1.0):
         now = time.time()
-        if now - prev_time < 1.0:
-            time.sleep(0.1)
-            continue
-
         dt = now - prev_time
         prev_time = now
         
@@ -40,8 +38,6 @@ def monitor_fps():
 
         # Print the combined FPS string, clearing the line
         print(" | ".join(fps_strings) + "        ", end="\r")
-        
-        time.sleep(0.1)
 
 
 # --- Graceful Shutdown ---
@@ -61,7 +57,7 @@ def static_test_image():
     cv2.rectangle(img, (300, 300), (1000, 500), 255, -1)
     return img
 
-def static_test_grid():
+def _build_static_test_grid():
     height, width = 720, 1280
     tile_size = 64
     gap = 10
@@ -71,18 +67,22 @@ def static_test_grid():
     cols = width // tile_size
 
     img = np.full((height, width), 64, dtype=np.uint8)
-    for r in range(rows):
-        for c in range(cols):
-            if (r + c) % 2 == 0:
-                y0 = r * tile_size + gap // 2
-                x0 = c * tile_size + gap // 2
-                y1 = y0 + white_size
-                x1 = x0 + white_size
-                y1 = min(y1, height)
-                x1 = min(x1, width)
-                img[y0:y1, x0:x1] = 255
+    # View the tiled area as (rows, cols, tile, tile) and fill the inset of every
+    # "even" checkerboard tile in a single vectorized assignment.
+    tiles = img[:rows * tile_size, :cols * tile_size].reshape(rows, tile_size, cols, tile_size).transpose(0, 2, 1, 3)
+    checker = ((np.arange(rows)[:, None] + np.arange(cols)[None, :]) & 1) == 0
+    inset = slice(gap // 2, gap // 2 + white_size)
+    tiles[checker, inset, inset] = 255
     return img
 
+# The grid never changes, so build it once at import. It is marked read-only
+# because every frame shares the same array.
+_STATIC_TEST_GRID = _build_static_test_grid()
+_STATIC_TEST_GRID.setflags(write=False)
+
+def static_test_grid():
+    return _STATIC_TEST_GRID
+
 def dynamic_test_image():
     t = int(time.time() * 90) % 1280
     img = np.zeros((720, 1280), dtype=np.uint8)
@@ -7,17 +7,93 @@ This file now includes a FinalProcessor for post-fusion rendering.
 Classes:
 - Worker: A base class for all threaded workers.
 - FrameGrabber: Connects to a camera or test source and grabs raw frames.
-- ContourProcessor: Performs saturation masking and contour detection on a frame.
+- ContourProcessor: Performs saturation masking and outlining (plus contour detection when needed) on a frame.
 - FinalProcessor: Applies CLAHE and draws contours on the final fused image.
+- BufferRing: A round-robin ring of preallocated frame buffers reused across packets.
 """
 
+import os
 import cv2
 import threading
 import time
 import queue
 import numpy as np
+from dataclasses import dataclass, fields
+
+import kernels
+from shared_state import shutdown_requested, view_updated
+
+@dataclass(slots=True)
+class FrameSlot:
+    """Preallocated output buffers for one ContourProcessor packet."""
+    gray: np.ndarray
+    mask: np.ndarray
+    edge: np.ndarray
+    outlined: np.ndarray
+
+    @classmethod
+    def allocate(cls, shape):
+        h, w = shape
+        return cls(
+            gray=np.empty((h, w), dtype=np.uint8),
+            mask=np.empty((h, w), dtype=np.uint8),
+            edge=np.empty((h, w), dtype=np.uint8),
+            outlined=np.empty((h, w, 3), dtype=np.uint8),
+        )
+
+
+class BufferRing:
+    """
+    A fixed-depth ring of preallocated slots, handed out round-robin.
+    A slot is rewritten `depth` packets after it was handed out, so the depth must
+    cover every packet that may still be referenced downstream (queued, being
+    processed, or held for display). The ring is reallocated if the frame shape changes.
+    """
+    def __init__(self, depth, factory):
+        self.depth = depth
+        self.factory = factory
+        self.shape = None
+        self.slots = []
+        self.index = 0
+
+    def allocate(self, shape):
+        """
+        (Re)allocates every slot for the given shape. Each buffer is written once here, so
+        its pages are faulted in up front rather than on first use in the middle of a stream.
+        Workers call this at startup for the configured resolution.
+        """
+        self.slots = [self.factory(shape) for _ in range(self.depth)]
+        for slot in self.slots:
+            arrays = (slot,) if isinstance(slot, np.ndarray) else (getattr(slot, f.name) for f in fields(slot))
+            for array in arrays:
+                array.fill(0)
+        self.shape = shape
+        self.index = 0
+
+    def next(self, shape):
+        if shape != self.shape:
+            self.allocate(shape)
+        slot = self.slots[self.index]
+        self.index = (self.index + 1) % self.depth
+        return slot
+
+
+def pin_current_thread(name, cores):
+    """
+    Restricts the calling thread to the given CPU cores (Linux only), so its frame
+    buffers stay warm in that core's cache. Does nothing when cores is empty/None.
+    """
+    if not cores:
+        return
+    if not hasattr(os, 'sched_setaffinity'):
+        print(f"[{name}] CPU affinity is not supported on this platform; ignoring 'cpu_affinity'")
+        return
+    try:
+        # pid 0 is the calling thread; threads it starts afterwards inherit the mask
+        os.sched_setaffinity(0, cores)
+    except (OSError, ValueError) as e:
+        print(f"[{name}] Could not pin to CPU cores {sorted(cores)}: {e}")
 
-from shared_state import shutdown_requested
 
 class Worker(threading.Thread):
     """Base class for all pipeline workers."""
@@ -28,6 +104,8 @@ class Worker(threading.Thread):
         self.fusion_config = fusion_config if fusion_config is not None else {}
         self.input_queue = input_queue
         self.output_queue = output_queue
+        # Optional LatestSlot for the web view; set on the last worker of a pipeline.
+        self.view_slot = None
         self.running = True
         self.pause = threading.Event()
         self.frame_counter = 0
@@ -36,61 +114,207 @@ class Worker(threading.Thread):
         self.running = False
 
     def run(self):
-        while self.running and not shutdown_requested.is_set():
-            if self.pause.is_set():
+        pin_current_thread(self.name, self.camera_config.get('cpu_affinity') or self.fusion_config.get('cpu_affinity'))
+        # Bound once so each pass through the loop skips the global/attribute lookups
+        shutdown_is_set = shutdown_requested.is_set
+        pause_is_set = self.pause.is_set
+        process_item = self.process_item
+        while self.running and not shutdown_is_set():
+            if pause_is_set():
                 time.sleep(0.01)
                 continue
-            self.process_item()
+            process_item()
 
     def process_item(self):
         raise NotImplementedError
 
+    def publish(self, output_data):
+        """Puts a packet on the output queue (dropping the oldest if full), if any, and the view slot."""
+        if self.output_queue is not None:
+            if self.output_queue.full():
+                try: self.output_queue.get_nowait()
+                except queue.Empty: pass
+            self.output_queue.put(output_data)
+        if self.view_slot is not None:
+            self.view_slot.put(output_data)
+            view_updated.set()
+        self.frame_counter += 1
+
 
 class FrameGrabber(Worker):
     """Grabs frames from a camera or test source and puts them on a queue."""
+    # Test sources are paced like a camera running at the rate requested from real ones
+    TEST_SOURCE_FPS = 60
+
     def __init__(self, name, camera_config, output_queue):
         super().__init__(name=name, camera_config=camera_config, output_queue=output_queue)
         self.source = self.camera_config['source']
         self.resolution = self.camera_config['resolution']
         self.is_test_source = callable(self.source)
+        self._frame_interval = 1.0 / self.TEST_SOURCE_FPS
+        self._next_frame_time = 0.0
+
+        # Grayscale capture requests an 8-bit mono format (or raw YUYV, keeping only the
+        # Y plane), skipping the MJPG decode to BGR and the BGR->gray conversion downstream.
+        self.grayscale_capture = self.camera_config.get('grayscale_capture', False)
+        self.capture_fourcc = None
 
         if not self.is_test_source:
             self.cap = cv2.VideoCapture(self.source)
-            self.cap.set(cv2.CAP_PROP_FOURCC, 1196444237) # 'MJPG'
+            if self.grayscale_capture:
+                # Mono sensors deliver GREY/Y800 natively: half of YUYV's bandwidth at the same
+                # luma. Otherwise YUYV, which most UVC cameras support uncompressed.
+                for fourcc in ('GREY', 'Y800', 'YUYV'):
+                    code = cv2.VideoWriter_fourcc(*fourcc)
+                    if self.cap.set(cv2.CAP_PROP_FOURCC, code) and int(self.cap.get(cv2.CAP_PROP_FOURCC)) == code:
+                        self.capture_fourcc = fourcc
+                        print(f"[{self.name}] Grayscale capture using {fourcc}")
+                        self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+                        break
+                else:
+                    # Raw frames in any other format cannot be read as luma; decode to BGR
+                    # and let the processor convert to gray instead
+                    print(f"[{self.name}] Camera offers no GREY/Y800/YUYV format; grayscale capture disabled")
+                    self.grayscale_capture = False
+                    self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+            if not self.grayscale_capture:
+                self.cap.set(cv2.CAP_PROP_FOURCC, 1196444237) # 'MJPG'
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
             self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
             self.cap.set(cv2.CAP_PROP_FPS, 60)
             print(f"[{self.name}] Opened camera {self.source}")
 
-    def stop(self):
-        super().stop()
-        if not self.is_test_source and hasattr(self, 'cap') and self.cap:
+            # A dedicated reader thread keeps the driver drained and holds only the
+            # most recent whole frame, so stale buffered frames are never processed.
+            # The lock makes handing the frame over and taking it back an exchange: a frame
+            # is either taken by process_item or returned to the reader for its next read.
+            self._latest_frame = None
+            self._taken_frame = None
+            self._frame_lock = threading.Lock()
+            # Frames are read into recycled buffers. Frames that are never taken are read
+            # over again, so the ring only advances once per published frame and a slot is
+            # reused `depth` published frames later. A raw frame rides along in every later
+            # packet, so the depth counts every holder downstream:
+            # - the buffer being read into and the latest frame not yet taken (2)
+            # - the hand-off to the processor (output_queue.maxsize) and the frame it is working on (1)
+            # - the processor's output queue to fusion ('queue_depth') and the pair fusion is fusing (1)
+            # - the packets held by the pipeline's view slot and the web feeder (2)
+            # - /align's read of the latest view packet (1)
+            # Recordings copy each frame before writing it, so they hold no buffer.
+            self._raw_buffers = BufferRing(
+                depth=output_queue.maxsize + self.camera_config.get('queue_depth', 2) + 7,
+                factory=lambda shape: np.empty(shape, dtype=np.uint8),
+            )
+            # Prefault the ring for the requested resolution before capture starts
+            w, h = self.resolution
+            self._raw_buffers.allocate((h, w) if self.grayscale_capture else (h, w, 3))
+            self._frame_ready = threading.Event()
+            self._reader = threading.Thread(target=self._read_loop, name=f"{self.name}_reader", daemon=True)
+
+    def run(self):
+        if not self.is_test_source:
+            self._reader.start()
+        super().run()
+        if not self.is_test_source:
+            self._reader.join()
             self.cap.release()
 
+    def _read_loop(self):
+        """Continuously reads frames into recycled buffers, keeping only the latest one."""
+        pin_current_thread(f"{self.name}_reader", self.camera_config.get('cpu_affinity'))
+        scratch = None
+        # A published frame that was replaced before process_item took it. Nothing
+        # downstream has seen it, so the next frame is read into it.
+        spare = None
+        # Reads go straight into the ring prepared for the configured resolution
+        frame_shape = self._raw_buffers.shape
+        shutdown_is_set = shutdown_requested.is_set
+        read = self.cap.read
+        while self.running and not shutdown_is_set():
+            if self.grayscale_capture:
+                # Raw YUYV lands in one scratch buffer; only the luma plane is published
+                ret, scratch = read(scratch)
+            else:
+                # OpenCV reallocates if the camera's frame size differs; the ring then follows it
+                dst = spare if spare is not None else (self._raw_buffers.next(frame_shape) if frame_shape else None)
+                spare = None
+                ret, frame = read(dst)
+            if not ret:
+                print(f"[{self.name}] Frame grab failed")
+                if not self.grayscale_capture:
+                    spare = dst
+                time.sleep(0.05)
+                continue
+            if self.grayscale_capture:
+                frame = self._luma(scratch, spare)
+            frame_shape = frame.shape
+            with self._frame_lock:
+                spare = self._latest_frame
+                self._latest_frame = frame
+            if spare is not None and spare.shape != frame_shape:
+                spare = None
+            self._frame_ready.set()
+
+    def _luma(self, frame, dst=None):
+        """
+        Extracts the Y plane from an unconverted YUYV or mono (GREY/Y800) frame,
+        into dst if it has the right shape, otherwise into the next ring buffer.
+        """
+        if frame.ndim == 2 and frame.shape[0] == 1:
+            # Some backends hand back the raw buffer as a single row
+            h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            frame = frame.reshape(h, -1, 2) if self.capture_fourcc == 'YUYV' else frame.reshape(h, -1)
+        shape = frame.shape[:2]
+        if dst is None or dst.shape != shape:
+            dst = self._raw_buffers.next(shape)
+        if frame.ndim == 3:
+            # YUYV: Y is the first byte of each pixel pair
+            return cv2.extractChannel(frame, 0, dst=dst)
+        # Mono frames are already the luma plane; copy it out of the scratch buffer
+        np.copyto(dst, frame)
+        return dst
+
+    def async_read(self, require_new=True, timeout=0.1):
+        """
+        Takes the latest frame from the reader thread.
+        With require_new, waits for a frame not yet taken and gives None on timeout;
+        otherwise falls back to the last frame taken when no new one is ready.
+        """
+        if require_new:
+            if not self._frame_ready.wait(timeout):
+                return None
+            self._frame_ready.clear()
+        with self._frame_lock:
+            frame = self._latest_frame
+            self._latest_frame = None
+        if frame is None:
+            return None if require_new else self._taken_frame
+        self._taken_frame = frame
+        return frame
+
     def process_item(self):
         if self.is_test_source:
+            # Camera reads block on the reader thread; test sources wait out the frame
+            # interval on the shutdown event, so they also stop without delay
+            delay = self._next_frame_time - time.monotonic()
+            if delay > 0 and shutdown_requested.wait(delay):
+                return
+            self._next_frame_time = max(self._next_frame_time + self._frame_interval, time.monotonic())
             raw_frame = self.source()
         else:
-            ret, raw_frame = self.cap.read()
-            if not ret:
-                print(f"[{self.name}] Frame grab failed")
-                time.sleep(0.05)
+            raw_frame = self.async_read()
+            if raw_frame is None:
                 return
 
         frame_data = {
-            'timestamp': time.time(),
+            'timestamp': time.monotonic_ns(),
             'source_id': self.name,
             'raw_frame': raw_frame,
             'overlay_color': self.camera_config.get('overlay_color', (0, 255, 0))
         }
 
-        if self.output_queue.full():
-            try: self.output_queue.get_nowait()
-            except queue.Empty: pass
-        self.output_queue.put(frame_data)
-        self.frame_counter += 1
-        time.sleep(0.001)
+        self.publish(frame_data)
 
 
 class ContourProcessor(Worker):
@@ -98,6 +322,21 @@ class ContourProcessor(Worker):
     def __init__(self, name, camera_config, input_queue, output_queue):
         super().__init__(name=name, camera_config=camera_config, input_queue=input_queue, output_queue=output_queue)
         self.saturation_threshold = self.camera_config.get('saturation_threshold', 240)
+        # Vector contours are only needed by downstream consumers such as fusion
+        self.emit_contours = self.camera_config.get('emit_contours', True)
+        self.outline_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        # Optionally do threshold + outline in one compiled pass (see kernels.py)
+        self.use_numba = self.camera_config.get('use_numba', False)
+        if self.use_numba and not kernels.HAVE_NUMBA:
+            print(f"[{self.name}] Numba is not installed; using the OpenCV path")
+            self.use_numba = False
+        # Output buffers are recycled instead of allocated per frame. Besides the queued
+        # packets, one may be in use by the consumer, one held for the web view and one
+        # being encoded or recorded.
+        self.buffers = BufferRing(depth=output_queue.maxsize + 3, factory=FrameSlot.allocate)
+        # Prefault them for the configured resolution before the first frame arrives
+        w, h = self.camera_config['resolution']
+        self.buffers.allocate((h, w))
 
     def process_item(self):
         try:
@@ -106,38 +345,84 @@ class ContourProcessor(Worker):
             return
 
         raw_frame = data['raw_frame']
-        gray_frame = cv2.cvtColor(raw_frame, cv2.COLOR_BGR2GRAY) if len(raw_frame.shape) > 2 else raw_frame
+        slot = self.buffers.next(raw_frame.shape[:2])
+        if len(raw_frame.shape) > 2:
+            gray_frame = cv2.cvtColor(raw_frame, cv2.COLOR_BGR2GRAY, dst=slot.gray)
+        else:
+            gray_frame = raw_frame
 
-        mask = cv2.inRange(gray_frame, self.saturation_threshold, 255)
-        outlined_frame = cv2.cvtColor(gray_frame, cv2.COLOR_GRAY2BGR)
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        cv2.drawContours(outlined_frame, contours, -1, data['overlay_color'], 2)
+        if self.use_numba:
+            mask, outlined_frame = kernels.mask_and_outline(
+                gray_frame, self.saturation_threshold, data['overlay_color'], slot.mask, slot.outlined)
+        else:
+            mask = cv2.inRange(gray_frame, self.saturation_threshold, 255, dst=slot.mask)
 
-        # Explicitly carry forward all original data (like raw_frame, timestamp)
-        # and add the new processed data to the packet.
-        output_data = {
-            **data,
-            'gray_frame': gray_frame,
-            'mask': mask,
-            'outlined': outlined_frame,
-            'contours': contours
-        }
+            # The morphological gradient of a binary mask is its ~2px boundary, so the
+            # outline can be painted straight from the mask without tracing contours.
+            edge = cv2.morphologyEx(mask, cv2.MORPH_GRADIENT, self.outline_kernel, dst=slot.edge)
+            outlined_frame = cv2.cvtColor(gray_frame, cv2.COLOR_GRAY2BGR, dst=slot.outlined)
+            outlined_frame[edge != 0] = data['overlay_color']
 
-        if self.output_queue.full():
-            try: self.output_queue.get_nowait()
-            except queue.Empty: pass
-        self.output_queue.put(output_data)
-        self.frame_counter += 1
+        contours = ()
+        if self.emit_contours:
+            # TC89_KCOS keeps fewer points per contour than SIMPLE at the same drawn quality
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_TC89_KCOS)
+
+        # Carry forward all original data (like raw_frame, timestamp) by adding the
+        # processed data to the incoming packet itself. The grabber builds a fresh packet
+        # per frame and this worker is its only consumer, so no second dict is needed.
+        data['gray_frame'] = gray_frame
+        data['mask'] = mask
+        data['outlined'] = outlined_frame
+        data['contours'] = contours
+
+        self.publish(data)
+
+
+def cuda_available():
+    """True if this OpenCV build has CUDA support and a CUDA device is present."""
+    try:
+        return hasattr(cv2.cuda, 'createCLAHE') and cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except (AttributeError, cv2.error):
+        return False
 
 
 class FinalProcessor(Worker):
     """Applies CLAHE and draws contours on the final fused image."""
-    def __init__(self, name, fusion_config, input_queue, output_queue):
+    def __init__(self, name, fusion_config, input_queue, output_queue=None):
         super().__init__(name=name, fusion_config=fusion_config, input_queue=input_queue, output_queue=output_queue)
-        self.clahe = cv2.createCLAHE(
-            clipLimit=self.fusion_config.get('clahe_clip_limit', 2.0),
-            tileGridSize=self.fusion_config.get('clahe_tile_grid_size', (8, 8))
-        )
+        clip_limit = self.fusion_config.get('clahe_clip_limit', 2.0)
+        tile_grid_size = self.fusion_config.get('clahe_tile_grid_size', (8, 8))
+        self.clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+
+        # Optionally run CLAHE on the GPU, reusing device buffers and one CUDA stream
+        self.use_cuda = self.fusion_config.get('use_cuda', False)
+        if self.use_cuda and not cuda_available():
+            print(f"[{self.name}] No CUDA-enabled OpenCV/device found; using CPU CLAHE")
+            self.use_cuda = False
+        if self.use_cuda:
+            self.cuda_stream = cv2.cuda_Stream()
+            self.cuda_clahe = cv2.cuda.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+            self.gpu_in = cv2.cuda_GpuMat()
+            self.gpu_out = cv2.cuda_GpuMat()
+
+        # The CLAHE result is only an intermediate, so one scratch buffer is reused.
+        # Rendered frames are held downstream like ContourProcessor output (queued, held
+        # for the web view, being encoded or recorded), so they come from a ring.
+        self.enhanced_buffer = BufferRing(depth=1, factory=lambda shape: np.empty(shape, dtype=np.uint8))
+        queued = output_queue.maxsize if output_queue is not None else 0
+        self.buffers = BufferRing(depth=queued + 3,
+                                  factory=lambda shape: np.empty((*shape, 3), dtype=np.uint8))
+
+    def apply_clahe(self, gray):
+        """Applies CLAHE on the GPU when enabled, otherwise on the CPU."""
+        if not self.use_cuda:
+            return self.clahe.apply(gray, self.enhanced_buffer.next(gray.shape))
+        self.gpu_in.upload(gray, stream=self.cuda_stream)
+        self.cuda_clahe.apply(self.gpu_in, self.cuda_stream, dst=self.gpu_out)
+        enhanced = self.gpu_out.download(stream=self.cuda_stream)
+        self.cuda_stream.waitForCompletion()
+        return enhanced
 
     def process_item(self):
         try:
@@ -148,24 +433,21 @@ class FinalProcessor(Worker):
         fused_gray = data['fused_gray']
 
         # 1. Apply CLAHE to the entire fused image
-        enhanced_gray = self.clahe.apply(fused_gray)
+        enhanced_gray = self.apply_clahe(fused_gray)
 
         # 2. Convert to color for drawing
-        final_image = cv2.cvtColor(enhanced_gray, cv2.COLOR_GRAY2BGR)
+        final_image = cv2.cvtColor(enhanced_gray, cv2.COLOR_GRAY2BGR, dst=self.buffers.next(enhanced_gray.shape))
 
-        # 3. Draw contours from both sources
-        cv2.drawContours(final_image, data['contours1'], -1, data['color1'], 1)
-        cv2.drawContours(final_image, data['contours2'], -1, data['color2'], 1)
+        # 3. Draw contours from both sources. cam1's need no offset, so they go straight to
+        # polylines, which skips drawContours' hierarchy handling (the pixels are identical).
+        cv2.polylines(final_image, data['contours1'], True, data['color1'], 1)
+        cv2.drawContours(final_image, data['contours2'], -1, data['color2'], 1, offset=data.get('offset2', (0, 0)))
 
         # 4. Create the final output packet for the web view
         output_data = {
-            'timestamp': time.time(),
+            'timestamp': time.monotonic_ns(),
             'source_id': 'fusion',
             'outlined': final_image # Use 'outlined' key for web compatibility
         }
 
-        if self.output_queue.full():
-            try: self.output_queue.get_nowait()
-            except queue.Empty: pass
-        self.output_queue.put(output_data)
-        self.frame_counter += 1
+        self.publish(output_data)